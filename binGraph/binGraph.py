@@ -4,14 +4,22 @@ import importlib
 import sys
 import os
 import logging
+import re
 import argparse
-import io
+import tempfile
 import base64
 import json
+import hashlib
+import mmap
+import stat
+import shutil
+import queue
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 __version__ = {}
 __version__["codename"] = "Iron Airedale"  # http://www.codenamegenerator.com/?prefix=metal&dictionary=dogs
 __version__["digit"] = 3.4
+__version_json__ = json.dumps(__version__)  # Rendered once for the json output
 
 
 # ## Global graphing default values
@@ -21,6 +29,10 @@ __figdpi__ = 100  # DPI of figure
 __json__ = False  # Show the plot interactively
 __showplt__ = False  # Show the plot interactively
 __blob__ = False  # Treat all files as binary blobs. Disable intelligently parsing of file format specific features.
+__jobs__ = os.cpu_count() or 1  # Number of files to graph in parallel
+__walk_threads__ = 16  # Number of directories listed in parallel when recursing
+__cache_dir__ = None  # Directory to cache generated graphs in (disabled if None)
+__cache_size__ = 512  # Maximum size of the graph cache in MB
 
 # ## Logging
 # # Lower the matplotlib logger
@@ -37,13 +49,15 @@ sys.path.insert(0, CWD)
 
 
 def File2Strings(filename):
-    if not os.path.exists(filename) or not os.path.isfile(filename):
-        return None
     try:
-        with open(filename, "r") as f:
-            return [line.rstrip("\n") for line in f.readlines()]
-    except Exception as e:
+        with open(filename, "rb") as f:
+            # # Split the raw bytes (only on line breaks) and decode each path as the filesystem would
+            return [os.fsdecode(line) for line in f.read().splitlines()]
+    except (FileNotFoundError, IsADirectoryError):
+        return None
+    except OSError as e:
         log.error("Bingraph load file error: %s", str(e))
+        return None
 
 # # Gather files to process - give it a list of paths (files or directories)
 # # and it will return all files in a list
@@ -52,13 +66,11 @@ def find_files(search_paths, recurse):
     __files__ = []
     for f in search_paths:
         if recurse and os.path.isdir(f):
-            for dir_name, dirs, files in os.walk(f):
-                log.debug("Found directory: %s", dir_name)
-                for fname in files:
-                    abs_fpath = os.path.join(dir_name, fname)
-                    if os.path.isfile(abs_fpath) and not os.path.islink(abs_fpath) and not os.stat(abs_fpath).st_size == 0:
-                        log.info('File found: "%s"', abs_fpath)
-                        __files__.append(abs_fpath)
+            found = walk_dir(f)
+
+            # # Process in inode order, which roughly follows the on disk layout and so helps readahead
+            found.sort()
+            __files__ += [abs_fpath for _, _, abs_fpath in found]
         elif os.path.isfile(f) and not os.path.islink(f) and not os.stat(f).st_size == 0:
             abs_fpath = os.path.abspath(f)
             log.debug('Found file: "%s"', abs_fpath)
@@ -71,9 +83,69 @@ def find_files(search_paths, recurse):
     return __files__
 
 
-# # Cleanup given filename
+# # List every non-empty regular file below top as (st_dev, st_ino, path). Listing a directory is mostly
+# # waiting on syscalls, which release the GIL, so directories are listed by a pool of threads
+def walk_dir(top, max_workers=__walk_threads__):
+
+    found = []
+    done = queue.SimpleQueue()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        executor.submit(scan_dir, top).add_done_callback(done.put)
+        pending = 1
+
+        # # Finished listings are handed back through a queue, and their sub directories queued in turn
+        while pending:
+            sub_dirs, files = done.get().result()
+            pending -= 1
+            found += files
+
+            for sub_dir in sub_dirs:
+                executor.submit(scan_dir, sub_dir).add_done_callback(done.put)
+            pending += len(sub_dirs)
+
+    return found
+
+
+# # List one directory - returns its sub directories, and its non-empty regular files as (st_dev, st_ino, path).
+# # Listed through an open fd, so each file is stat'd relative to it rather than resolving its full path again.
+# # lstat once per file, symlinks are not regular files
+def scan_dir(dir_name):
+
+    sub_dirs = []
+    files = []
+    log.debug("Found directory: %s", dir_name)
+    try:
+        dir_fd = os.open(dir_name, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError as e:
+        log.warning('Failed to open directory "%s": %s', dir_name, e)
+        return sub_dirs, files
+
+    try:
+        with os.scandir(dir_fd) as it:
+            for entry in it:
+                abs_fpath = os.path.join(dir_name, entry.name)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_dirs.append(abs_fpath)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        if not st.st_size == 0:
+                            log.info('File found: "%s"', abs_fpath)
+                            files.append((st.st_dev, st.st_ino, abs_fpath))
+                except OSError as e:
+                    log.warning('Failed to stat "%s": %s', abs_fpath, e)
+    finally:
+        os.close(dir_fd)
+
+    return sub_dirs, files
+
+
+# # Cleanup given filename - \w is str.isalnum() plus "_", so this keeps the same (unicode) alphanumerics
+__fname_strip__ = re.compile(r"[\W_]+")
+
+
 def clean_fname(fn):
-    return "".join([c for c in fn if c.isalnum()])
+    return __fname_strip__.sub("", fn)
 
 
 # # Generate the different file names required
@@ -99,18 +171,40 @@ def gen_names(ffrmt, abs_fpath, abs_save_path, save_prefix=None, graphtype=None,
     abs_save_fpath = os.path.join(abs_save_path, save_fname)
     return abs_save_fpath, os.path.basename(abs_fpath), cleaned_fname
 
-# # Try and import the graphs
-try:
-    graphs = {}
-    for graph_name in ("ent", "hist"):
-        graphs[graph_name] = importlib.import_module(f"graphs.{graph_name}.graph")
+# # Graph types available, imported on first use by load_graphs
+__graphnames__ = ("ent", "hist")
+graphs = {}
+
+
+# # Import the given graph types (default: all of them). Deferred until needed so importing
+# # binGraph doesn't pull in matplotlib
+def load_graphs(names=__graphnames__):
+
+    # # Don't let matplotlib probe for a GUI backend, the graphs are rendered with Agg
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    try:
+        for graph_name in names:
+            if graph_name not in graphs:
+                graphs[graph_name] = importlib.import_module(f"graphs.{graph_name}.graph")
+
+    except Exception as e:
+        log.critical("Failed to import graph: %s", e)
+
+    return graphs
+
+
+# # Graph types to generate for the given --graphtype
+def requested_graphs(graphtype):
+
+    if graphtype == "all":
+        return load_graphs()
+    else:
+        return {graphtype: load_graphs((graphtype,))[graphtype]}
 
-except Exception as e:
-    log.critical("Failed to import graph: {}".format(e))
 
 # # Main routine - import this and provide a
 def generate_graphs(args_dict):
-    log.debug("args_dict = " + str(args_dict))
     """
         Dictionary of arguments to generate the graphs.
         See individual graphs for possible arguments
@@ -128,6 +222,9 @@ def generate_graphs(args_dict):
             'figsize': (12, 4),
             'dpi': 100,
             'blob': False,
+            'cache_dir': None,
+            'cache_size': 512,
+            'jobs': 4,
             'verbose': False,
             'graphtype': 'ent',
             'chunks': 750,
@@ -145,18 +242,76 @@ def generate_graphs(args_dict):
         logging.getLogger().setLevel(logging.DEBUG)
         logging.getLogger("matplotlib").setLevel(logging.WARNING)
 
+    log.debug("args_dict = %s", args_dict)
+
     # # Detect if all graphs are being requested
-    __graphtypes__ = []
-    if args_dict.get("graphtype", "") == "all":
-        __graphtypes__ = graphs
-    else:
-        __graphtypes__ = {args_dict["graphtype"]: graphs[args_dict["graphtype"]]}
+    __graphtypes__ = requested_graphs(args_dict.get("graphtype", ""))
+
+    log.debug("Generating graphs: %s", ", ".join(__graphtypes__))
+
+    # # Use the compiled entropy kernels if numba is available. Installed isn't enough, it has to import
+    # # (e.g. numba refuses to load against a newer numpy than it supports)
+    args_dict["_use_numba"] = False
+    if "ent" in __graphtypes__:
+        try:
+            import numba  # noqa: F401
+
+            args_dict["_use_numba"] = True
+        except Exception as e:
+            log.debug("Not using numba: %s", e)
+
+    # # Setup the graph cache
+    if args_dict.get("cache_dir") and not args_dict["showplt"]:
+        os.makedirs(args_dict["cache_dir"], exist_ok=True)
+        args_dict["_cache_options"] = hash_options(args_dict)
+
+    # # Iterate over all given files - each file is independent, so farm them out to a process pool.
+    # # Serial unless asked, library callers may already be running in a (daemonic) worker process
+    multi = len(args_dict["files"]) > 1
+    jobs = args_dict.get("jobs") or 1
+
+    try:
+        if args_dict["showplt"] or jobs <= 1 or not multi:
+            for index, abs_fpath in enumerate(args_dict["files"]):
+                _process_one((index if multi else None, abs_fpath, args_dict))
+        else:
+            # # Don't pickle the full file list to the workers with every task
+            worker_args = {k: v for k, v in args_dict.items() if k != "files"}
+            tasks = [(index, abs_fpath, worker_args) for index, abs_fpath in enumerate(args_dict["files"])]
+            with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+                list(executor.map(_process_one, tasks))
+
+    finally:
+        # # Don't hand this run's figure (or its size and dpi) on to the next call
+        close_figure()
+
+    if args_dict.get("cache_dir") and not args_dict["showplt"]:
+        cache_evict(args_dict["cache_dir"], args_dict.get("cache_size", __cache_size__))
 
-    log.debug("Generating graphs: {}".format(", ".join(list(__graphtypes__.keys()))))
 
-    # # Iterate over all given files
-    for index, abs_fpath in enumerate(args_dict["files"]):
-        log.debug('Processing: "{}"'.format(abs_fpath))
+# # Generate all requested graphs for a single file - module level so it can be pickled to a worker process
+def _process_one(index_fpath_args):
+    findex, abs_fpath, args_dict = index_fpath_args
+
+    # # Detect if all graphs are being requested. Imported here too as spawned workers start afresh
+    __graphtypes__ = requested_graphs(args_dict.get("graphtype", ""))
+
+    log.debug('Processing: "%s"', abs_fpath)
+
+    # # Map the file once and share it between all graph types
+    fh = open(abs_fpath, "rb")
+    mm = None
+
+    # # The command line binGraph was run with, for the json output
+    cmdline = args_dict.get("_cmdline") or " ".join(sys.argv)
+
+    try:
+        mm = map_file(fh)
+
+        # # Graphs are cached by file contents, not path - hash once for all graph types
+        cache_dir = None if args_dict["showplt"] else args_dict.get("cache_dir")
+        if cache_dir:
+            file_hash = hash_file(abs_fpath) if mm is None else hashlib.sha256(mm).hexdigest()
 
         for module_name, module in __graphtypes__.items():
             abs_save_fpath, fname, cleaned_fname = gen_names(
@@ -165,50 +320,281 @@ def generate_graphs(args_dict):
                 args_dict["save_dir"],
                 save_prefix=args_dict["prefix"],
                 graphtype=module_name,
-                findex=(index if len(args_dict["files"]) > 1 else None),
+                findex=findex,
             )
             args_dict["abs_fpath"] = abs_fpath  # Define the current file we are acting on
             args_dict["fname"] = fname
             args_dict["cleaned_fname"] = cleaned_fname
 
-            # # Generate and output the graph
-            plt, save_kwargs, json_data = module.generate(**args_dict)
-            fig = plt.gcf()
-            fig.set_size_inches(*args_dict["figsize"], forward=True)
+            # # Reuse a previously generated graph if this file has been seen before
+            if cache_dir:
+                key = cache_key(file_hash, module_name, fname, args_dict["_cache_options"])
+                cached_fpath, json_data = cache_lookup(cache_dir, key, args_dict["format"])
+
+                if cached_fpath:
+                    log.debug('Cache hit: "%s"', cached_fpath)
+
+                    if args_dict["json"]:
+                        abs_save_fpath = os.path.splitext(abs_save_fpath)[0] + ".json"
+                        with open(cached_fpath, "rb") as img_fh:
+                            write_json(abs_save_fpath, json_data, img_fh, cmdline)
+                    else:
+                        shutil.copyfile(cached_fpath, abs_save_fpath)
+
+                    log.info('Graph saved to: "%s"', abs_save_fpath)
+                    continue
+
+            # # Generate and output the graph. The figure already has its size, dpi and layout engine
+            fig = get_figure(args_dict["figsize"], args_dict["dpi"])
+            try:
+                _, save_kwargs, json_data = module.generate(fig=fig, _mmap=mm, **args_dict)
+
+                if args_dict["showplt"]:
+                    log.info("Opening graph interactively")
+                    import matplotlib.pyplot as plt
+
+                    plt.show()
+
+                elif args_dict["json"]:
+                    log.info("Saving as json file")
 
-            plt.tight_layout()
+                    # # Spills to disk if the graph is large
+                    abs_save_fpath = os.path.splitext(abs_save_fpath)[0] + ".json"
+                    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as buf:
+                        fig.savefig(buf, format=args_dict["format"], dpi="figure", **save_kwargs)
 
-            if args_dict["showplt"]:
-                log.info("Opening graph interactively")
-                plt.show()
+                        buf.seek(0)
+                        write_json(abs_save_fpath, json_data, buf, cmdline)
 
-            elif args_dict["json"]:
-                log.info("Saving as json file")
+                        if cache_dir:
+                            buf.seek(0)
+                            cache_store(cache_dir, key, args_dict["format"], buf, json_data)
 
-                output = {}
-                output["info"] = json_data
+                    log.info('Graph saved to: "%s"', abs_save_fpath)
 
-                buf = io.BytesIO()
-                plt.savefig(buf, format=args_dict["format"], dpi=args_dict["dpi"], **save_kwargs)
-                output["graph"] = base64.b64encode(buf.getvalue()).decode()
-                buf.close()
+                else:
+                    # # Rendered straight from the figure's canvas into a large buffer, written out in as few writes as possible
+                    with open(abs_save_fpath, "wb", buffering=1024 * 1024) as outfile:
+                        fig.savefig(outfile, format=args_dict["format"], dpi="figure", **save_kwargs)
+                    log.info('Graph saved to: "%s"', abs_save_fpath)
 
-                output["cmdline"] = " ".join(args_dict)
-                output["version"] = __version__
+                    if cache_dir:
+                        with open(abs_save_fpath, "rb") as img_fh:
+                            cache_store(cache_dir, key, args_dict["format"], img_fh, json_data)
 
-                abs_save_fpath = os.path.splitext(abs_save_fpath)[0] + ".json"
-                with open(abs_save_fpath, "w") as outfile:
-                    json.dump(output, outfile)
+            finally:
+                # # Keep the figure (and its canvas) for the next graph, only the axes are thrown away.
+                # # Cleared even if the graph failed, so its axes aren't drawn under the next graph
+                fig.clear()
 
-                log.info('Graph saved to: "{}"'.format(abs_save_fpath))
+    finally:
+        unmap_file(fh, mm)
 
-            else:
-                plt.savefig(abs_save_fpath, format=args_dict["format"], dpi=args_dict["dpi"], **save_kwargs)
-                log.info('Graph saved to: "{}"'.format(abs_save_fpath))
 
-            plt.clf()
-            plt.cla()
-            plt.close()
+# # Map a file read only for sequential reading, None for empty or non-regular files (which can't be mapped).
+# # The whole file is read once from start to end, so ask the kernel to start reading ahead now
+def map_file(fh):
+
+    st = os.fstat(fh.fileno())
+    if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+        return None
+
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+
+    mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    return mm
+
+
+# # Release a file from map_file. Its pages won't be needed again, so drop them from the page cache
+# # rather than letting them push out data that will be (fonts, libraries, the next file)
+def unmap_file(fh, mm):
+
+    if mm is not None:
+        try:
+            mm.close()
+        except BufferError:
+            # # A failed graph may still reference the mapping, it is released when collected
+            pass
+
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        # # Only a hint, e.g. pipes don't support it
+        pass
+    finally:
+        fh.close()
+
+
+# # One figure per process is drawn on for every graph. Its tight layout is solved as part of each
+# # draw, rather than by a separate tight_layout() call per graph
+_figure = None
+
+
+def get_figure(figsize, dpi):
+    global _figure
+    if _figure is None:
+        import matplotlib.pyplot as plt
+
+        _figure = plt.figure(figsize=figsize, dpi=dpi, tight_layout=True)
+    return _figure
+
+
+def close_figure():
+    global _figure
+    if _figure is not None:
+        import matplotlib.pyplot as plt
+
+        plt.close(_figure)
+        _figure = None
+
+
+# # Write the graph and its information out as a json file. The image is base64 encoded straight into
+# # the output in slices, so it is never held in memory as a whole alongside its encoding
+def write_json(abs_save_fpath, json_data, img_fh, cmdline):
+
+    with open(abs_save_fpath, "w") as outfile:
+        outfile.write('{"info": ')
+        json.dump(json_data, outfile)
+
+        outfile.write(', "graph": "')
+        # # A multiple of 3 bytes encodes without padding, so the slices join into one valid string
+        for chunk in iter(lambda: img_fh.read(3 * 64 * 1024), b""):
+            outfile.write(base64.b64encode(chunk).decode("ascii"))
+
+        outfile.write('", "cmdline": ')
+        json.dump(cmdline, outfile)
+        outfile.write(', "version": ')
+        outfile.write(__version_json__)
+        outfile.write("}")
+
+
+# ### Graph cache - generated graphs are stored under the SHA-256 of the file they were made from,
+# ### so unchanged files are not graphed again on later runs
+
+# # Options that do not change the generated graph
+__cache_ignore__ = (
+    "files",
+    "recurse",
+    "prefix",
+    "save_dir",
+    "json",
+    "showplt",
+    "jobs",
+    "verbose",
+    "graphtype",
+    "abs_fpath",
+    "fname",
+    "cleaned_fname",
+    "cache_dir",
+    "cache_size",
+)
+
+
+# # Hash the contents of a file without loading it all into memory
+def hash_file(abs_fpath):
+
+    with open(abs_fpath, "rb") as fh:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(fh, "sha256").hexdigest()
+
+        sha256 = hashlib.sha256()
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+
+# # Hash the graph options (and binGraph version) so that changing them invalidates the cache
+def hash_options(args_dict):
+
+    options = {k: v for k, v in args_dict.items() if k not in __cache_ignore__ and not k.startswith("_")}
+    options = json.dumps(options, sort_keys=True, default=str)
+    return hashlib.sha256("{}\0{}".format(__version_json__, options).encode("utf-8")).hexdigest()
+
+
+# # Name of a cache entry. The file name is part of the key as it is drawn on some graphs
+def cache_key(file_hash, graphtype, fname, options_hash):
+
+    extra = hashlib.sha256("{}\0{}".format(fname, options_hash).encode("utf-8", "replace")).hexdigest()
+    return "{}-{}-{}".format(file_hash, graphtype, extra[:16])
+
+
+# # Returns the path of the cached graph and its json data, or (None, None) when not cached
+def cache_lookup(cache_dir, key, ffrmt):
+
+    img_fpath = os.path.join(cache_dir, "{}.{}".format(key, ffrmt))
+    info_fpath = os.path.join(cache_dir, "{}.info.json".format(key))
+    try:
+        with open(info_fpath, "r") as fh:
+            json_data = json.load(fh)
+
+        # # Mark as recently used for eviction, atime is not reliable (noatime, relatime)
+        os.utime(img_fpath)
+        os.utime(info_fpath)
+    except (OSError, ValueError):
+        return None, None
+
+    return img_fpath, json_data
+
+
+# # Add a generated graph to the cache. Files are written under a temporary name and moved into place,
+# # so other processes never see a partial entry
+def cache_store(cache_dir, key, ffrmt, img_fh, json_data):
+
+    img_fpath = os.path.join(cache_dir, "{}.{}".format(key, ffrmt))
+    info_fpath = os.path.join(cache_dir, "{}.info.json".format(key))
+    tmp_suffix = ".{}.tmp".format(os.getpid())
+
+    try:
+        with open(img_fpath + tmp_suffix, "wb") as fh:
+            shutil.copyfileobj(img_fh, fh)
+        os.replace(img_fpath + tmp_suffix, img_fpath)
+
+        with open(info_fpath + tmp_suffix, "w") as fh:
+            json.dump(json_data, fh)
+        os.replace(info_fpath + tmp_suffix, info_fpath)
+
+    except (OSError, TypeError, ValueError) as e:
+        log.warning('Failed to cache graph "%s": %s', key, e)
+
+
+# # Remove the least recently used cache entries until the cache fits in cache_size MB.
+# # An entry's graph and json data are evicted together, files still being written by another process are left alone
+def cache_evict(cache_dir, cache_size):
+
+    entries = {}
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".tmp") or not entry.is_file(follow_symlinks=False):
+                continue
+
+            key = entry.name.partition(".")[0]
+            st = entry.stat(follow_symlinks=False)
+            used, size, fpaths = entries.get(key, (0, 0, []))
+            fpaths.append(entry.path)
+            entries[key] = (max(used, st.st_atime, st.st_mtime), size + st.st_size, fpaths)
+            total += st.st_size
+
+    max_bytes = cache_size * 1024 * 1024
+    if total <= max_bytes:
+        return
+
+    for _, size, fpaths in sorted(entries.values()):
+        if total <= max_bytes:
+            break
+        for fpath in fpaths:
+            try:
+                os.remove(fpath)
+                log.debug('Evicted from cache: "%s"', fpath)
+            except FileNotFoundError:
+                pass
+        total -= size
+
 
 def main():
 
@@ -259,6 +645,20 @@ def main():
         default=__blob__,
         help="Do not intelligently parse certain file types. Treat all files as a binary blob. E.g. don't add PE entry point or section splitter to the graph",
     )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        dest="cache_dir",
+        default=__cache_dir__,
+        metavar="/data/cache/",
+        help="Cache graphs here by file contents (SHA-256), unchanged files are not graphed again",
+    )
+    parser.add_argument(
+        "--cache_size", type=int, default=__cache_size__, metavar=__cache_size__, help="Maximum size of the graph cache in MB"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=__jobs__, metavar="#", help="Number of files to graph in parallel (worker processes)"
+    )
     parser.add_argument("-v", "--verbose", action="store_true", help="Print debug information to stderr")
 
     subparsers = parser.add_subparsers(
@@ -270,11 +670,12 @@ def main():
     subparsers.add_parser("all")
 
     # # Loop over all graph types to add their graph specific options
-    for name, module in graphs.items():
+    for name, module in load_graphs().items():
         module_parser = subparsers.add_parser(name)
         module.args_setup(module_parser)
 
     args = parser.parse_args()
+    args._cmdline = " ".join(sys.argv)
 
     ## # Verify global arguments
 
@@ -297,12 +698,11 @@ def main():
         log.critical("--out is not a directory: %s", args.save_dir)
         exit(1)
 
+    if args.cache_dir:
+        args.cache_dir = os.path.abspath(args.cache_dir)
+
     # # Detect if all graphs are being requested
-    __graphtypes__ = []
-    if args.graphtype == "all":
-        __graphtypes__ = graphs
-    else:
-        __graphtypes__ = {args.graphtype: graphs[args.graphtype]}
+    __graphtypes__ = requested_graphs(args.graphtype)
     # # Allow graph modules to verify if their arguments have been set correctly
     for name, module in __graphtypes__.items():
         module.args_validation(args)
@@ -0,0 +1,41 @@
+"""
+Numba compiled kernels for the entropy graph
+-------------------------------------------
+Only imported when numba is installed. The kernels are single threaded - files are already graphed in
+parallel by a process pool, which forks and so can't be used once numba's threading layer has started.
+
+chunk_histograms:   Count the occurrence of every byte value in each chunk of a file
+chunk_entropy:      Shannon entropy (base 256, so 0 to 1) of each chunk from its byte counts
+"""
+import math
+
+import numba
+
+
+@numba.njit(cache=True)
+def chunk_histograms(buf, chunksize, hist):
+
+    # # The last chunk may be short
+    for index in range(hist.shape[0]):
+        start = index * chunksize
+        end = min(start + chunksize, buf.shape[0])
+        for offset in range(start, end):
+            hist[index, buf[offset]] += 1
+
+
+@numba.njit(cache=True, fastmath=True)
+def chunk_entropy(hist, out):
+
+    log_base = math.log(256.0)
+    for index in range(hist.shape[0]):
+        total = 0
+        for b in range(256):
+            total += hist[index, b]
+
+        ent = 0.0
+        for b in range(256):
+            if hist[index, b]:
+                p = hist[index, b] / total
+                ent -= p * math.log(p)
+
+        out[index] = ent / log_base
@@ -29,7 +29,6 @@ from matplotlib.ticker import MaxNLocator
 import hashlib
 import numpy as np
 import statistics
-from collections import Counter
 import os
 import json
 import sys
@@ -96,9 +95,7 @@ def args_validation(args):
     # # Test to see what matplotlib backend is setup
     backend = matplotlib.get_backend()
     if not backend == "TkAgg":
-        log.warning(
-            '{} matplotlib backend in use. This graph generation was tested with "TkAgg", bugs may lie ahead...'.format(backend)
-        )
+        log.warning('%s matplotlib backend in use. This graph generation was tested with "TkAgg", bugs may lie ahead...', backend)
 
     # # Test to see if we should use defaults
     if args.graphtype == "all":
@@ -143,7 +140,7 @@ def args_validation(args):
 
                 # # Get/set the colour if it exists
                 if not "colour" in list(ib.keys()):
-                    log.warning("No colour defined for --ibytes byte range: {} {}".format(ib["name"], ib["bytes"]))
+                    log.warning("No colour defined for --ibytes byte range: %s %s", ib["name"], ib["bytes"])
                     ibyte["colour"] = matplotlib.colors.to_rgba(hash_colour(ib["name"]))
                 else:
                     ibyte["colour"] = matplotlib.colors.to_rgba(ib["colour"])
@@ -157,49 +154,53 @@ def args_validation(args):
 
 
 # # Generate the graph
-def generate(abs_fpath, fname, blob, chunks=__chunks__, ibytes=__ibytes_dict__, **kwargs):
-
-    with open(abs_fpath, "rb") as fh:
-        log.debug('Opening: "{}"'.format(fname))
-
-        # # Calculate the overall chunksize
-        fs = os.fstat(fh.fileno()).st_size
-        if chunks > fs:
-            chunksize = 1
-            nr_chunksize = 1
-        else:
-            chunksize = -(-fs // chunks)
-            nr_chunksize = fs / chunks
-
-        log.debug("Filesize: {}, Chunksize (rounded): {}, Chunksize: {}, Chunks: {}".format(fs, chunksize, nr_chunksize, chunks))
-        log.debug("Using ibytes: {}".format(ibytes))
-        log.debug("Producing shannon ent with chunksize {}".format(chunksize))
+def generate(
+    abs_fpath, fname, blob, chunks=__chunks__, ibytes=__ibytes_dict__, fig=None, _use_numba=False, _mmap=None, **kwargs
+):
 
-        for index, _ in enumerate(ibytes):
-            ibytes[index]["percentages"] = []
-
-        shannon_samples = []
-        for chunk in get_chunk(fh, chunksize=chunksize):
+    # # Use the file mapping shared by all graphs if given
+    if _mmap is not None:
+        buf = np.frombuffer(_mmap, dtype=np.uint8)
+    else:
+        log.debug('Opening: "%s"', fname)
+        buf = np.fromfile(abs_fpath, dtype=np.uint8)
+
+    # # Calculate the overall chunksize
+    fs = len(buf)
+    if chunks > fs:
+        chunksize = 1
+        nr_chunksize = 1
+    else:
+        chunksize = -(-fs // chunks)
+        nr_chunksize = fs / chunks
 
-            # # Calculate ent
-            ent = shannon_ent(chunk)
-            shannon_samples.append(ent)
+    log.debug("Filesize: %s, Chunksize (rounded): %s, Chunksize: %s, Chunks: %s", fs, chunksize, nr_chunksize, chunks)
+    log.debug("Using ibytes: %s", ibytes)
+    log.debug("Producing shannon ent with chunksize %s", chunksize)
 
-            # # Calculate percentages of given bytes, if provided
-            if ibytes:
-                cbytes = Counter(chunk)
+    # # Count every byte value in every chunk - all further calculations work from these counts
+    hist = chunk_histograms(buf, chunksize, use_numba=_use_numba)
 
-                for index, _ in enumerate(ibytes):
-                    occurrence = 0
-                    for b in ibytes[index]["bytes"]:
-                        occurrence += cbytes[b]
+    # # Release the file mapping so it can be closed
+    del buf
 
-                    ibytes[index]["percentages"].append((float(occurrence) / float(len(chunk))) * 100)
+    # # Calculate ent
+    shannon_samples = list(chunk_entropy(hist, use_numba=_use_numba))
 
-    log.debug('Closed: "{}"'.format(fname))
+    # # Calculate percentages of given bytes, if provided
+    percentages = []
+    if ibytes:
+        chunk_lens = hist.sum(axis=1)
+        for index, _ in enumerate(ibytes):
+            # # Byte values outside 0-255 never occur
+            bytes_idx = [b for b in ibytes[index]["bytes"] if 0 <= b <= 255]
+            percentages.append(hist[:, bytes_idx].sum(axis=1) / chunk_lens * 100)
 
-    # # Create the figure
-    fig, host = plt.subplots()
+    # # Create the figure, or draw on the one given
+    if fig is None:
+        fig, host = plt.subplots()
+    else:
+        host = fig.add_subplot()
     parsedbin = ""
     log.debug("Plotting shannon samples")
     host.plot(np.array(shannon_samples), label="Entropy", c=kwargs["entcolour"], zorder=1001, linewidth=1.2)
@@ -208,7 +209,7 @@ def generate(abs_fpath, fname, blob, chunks=__chunks__, ibytes=__ibytes_dict__,
     host.set_xlabel("File offset")
     host.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, pos: ("0x{:02X}".format(int(x * chunksize)))))
     host.xaxis.set_major_locator(MaxNLocator(10))
-    plt.xticks(rotation=-10, ha="left")
+    plt.setp(host.get_xticklabels(), rotation=-10, ha="left")
 
     # # Draw the graphs in order
     zorder = 1000
@@ -223,7 +224,7 @@ def generate(abs_fpath, fname, blob, chunks=__chunks__, ibytes=__ibytes_dict__,
         for index, _ in enumerate(ibytes):
             c = ibytes[index]["colour"]
             axBytePc.plot(
-                np.array(ibytes[index]["percentages"]), label=ibytes[index]["name"], c=c, zorder=zorder, linewidth=1.2, alpha=0.75
+                percentages[index], label=ibytes[index]["name"], c=c, zorder=zorder, linewidth=1.2, alpha=0.75
             )
             zorder -= 1
 
@@ -253,7 +254,7 @@ def generate(abs_fpath, fname, blob, chunks=__chunks__, ibytes=__ibytes_dict__,
                 phy_ep_pointer = bp.get_physical_from_rva(bp.get_virtual_ep())
                 if phy_ep_pointer:
                     phy_ep_pointer = phy_ep_pointer / nr_chunksize
-                    log.debug("{}: {}".format("Entrypoint", hex(bp.get_virtual_ep())))
+                    log.debug("Entrypoint: %#x", bp.get_virtual_ep())
 
                     host.axvline(x=phy_ep_pointer, linestyle=":", c="#0000ff", zorder=zorder - 1)
                     host.text(x=phy_ep_pointer, y=1.07, s="EntryPoint", color="b", rotation=45, va="bottom", ha="left")
@@ -269,7 +270,7 @@ def generate(abs_fpath, fname, blob, chunks=__chunks__, ibytes=__ibytes_dict__,
                     section_offset = section.offset / nr_chunksize
                     section_size = section.size / nr_chunksize
 
-                    log.debug("{}: {}".format(section_name, hex(section.offset)))
+                    log.debug("%s: %#x", section_name, section.offset)
 
                     host.axvline(x=section_offset, linestyle="--", zorder=zorder)
                     host.text(x=section_offset, y=1.07, s=section_name, rotation=45, va="bottom", ha="left")
@@ -297,7 +298,7 @@ def generate(abs_fpath, fname, blob, chunks=__chunks__, ibytes=__ibytes_dict__,
 
                 # # Entrypoint (EP) pointer and vline
                 phy_ep_pointer = parsedbin.virtual_address_to_offset(parsedbin.header.entrypoint) / nr_chunksize
-                log.debug("{}: {}".format("Entrypoint", hex(parsedbin.header.entrypoint)))
+                log.debug("Entrypoint: %#x", parsedbin.header.entrypoint)
 
                 host.axvline(x=phy_ep_pointer, linestyle=":", c="r", zorder=zorder - 1)
                 host.text(x=phy_ep_pointer, y=1.07, s="Entry", rotation=45, va="bottom", ha="left")
@@ -310,7 +311,7 @@ def generate(abs_fpath, fname, blob, chunks=__chunks__, ibytes=__ibytes_dict__,
                     section_name = safe_section_name(section.name, index)
                     section_offset = section.offset / nr_chunksize
 
-                    log.debug("{}: {}".format(section_name, hex(section.offset)))
+                    log.debug("%s: %#x", section_name, section.offset)
 
                     host.axvline(x=section_offset, linestyle="--", zorder=zorder)
                     host.text(x=section_offset, y=1.07, s=section_name, rotation=45, va="bottom", ha="left")
@@ -388,22 +389,22 @@ class bin_proxy(object):
                 self.bin = lief.parse(filepath=self.abs_fpath)
                 if type(self.bin) is lief.PE.Binary:
                     self.type = "PE"
-                    log.debug("Parsed with lief as: {}".format(self.type))
+                    log.debug("Parsed with lief as: %s", self.type)
                 else:
-                    log.debug("File is a currently unsupported format: {}".format(self.type))
+                    log.debug("File is a currently unsupported format: %s", self.type)
 
             except lief.bad_file as e:
-                log.warning("Failed to parse with lief: {}".format(e))
+                log.warning("Failed to parse with lief: %s", e)
 
         elif self.lib == "pefile":
             try:
                 self.bin = pefile.PE(self.abs_fpath)
                 self.type = "PE"
 
-                log.debug("Parsed with pefile as: {}".format(self.type))
+                log.debug("Parsed with pefile as: %s", self.type)
 
             except pefile.PEFormatError as e:
-                log.warning("Failed to parse with pefile: {}".format(e))
+                log.warning("Failed to parse with pefile: %s", e)
 
     def get_virtual_ep(self):
 
@@ -445,21 +446,6 @@ class section_proxy(object):
             self.size = self.lib_section.SizeOfRawData
 
 
-# # Read files as chunks
-def get_chunk(fh, chunksize=8192):
-    while True:
-        chunk = fh.read(chunksize)
-
-        # # Convert to bytearray if not python 3
-        if sys.version_info[0] <= 3:
-            chunk = bytearray(chunk)
-
-        if chunk:
-            yield list(chunk)
-        else:
-            break
-
-
 # # Some samples may have a corrupt section name (e.g. 206c0533ce9bf83ecdf904bec2f3532d)
 def safe_section_name(s_name, index):
     if s_name == "" or s_name is None:
@@ -484,13 +470,59 @@ def hash_colour(text):
     )
 
 
-# # Calculate entropy given a list
-def shannon_ent(labels, base=256):
-    value, counts = np.unique(labels, return_counts=True)
-    norm_counts = counts / counts.sum()
-    e = 0
-    base = e if base is None else base
-    return -(norm_counts * np.log(norm_counts) / np.log(base)).sum()
+# # Count the occurrences of each byte value in every chunksize chunk of buf, one row per chunk
+def chunk_histograms(buf, chunksize, use_numba=False):
+
+    hist = np.zeros((-(-len(buf) // chunksize), 256), dtype=np.int64)
+    if use_numba:
+        _load_kernel().chunk_histograms(buf, chunksize, hist)
+    else:
+        _numpy_histograms(buf, chunksize, hist)
+
+    return hist
+
+
+# # Histogram a block of whole chunks at a time. Offsetting each chunk's bytes by 256 * its row
+# # gives every chunk its own set of bins, so one bincount counts the whole block
+def _numpy_histograms(buf, chunksize, hist, block_size=4 * 1024 * 1024):
+
+    full_chunks = len(buf) // chunksize
+    rows_per_block = max(1, block_size // chunksize)
+
+    for start in range(0, full_chunks, rows_per_block):
+        end = min(start + rows_per_block, full_chunks)
+        rows = end - start
+
+        block = buf[start * chunksize : end * chunksize].reshape(rows, chunksize)
+        offsets = (np.arange(rows, dtype=np.intp) * 256)[:, None]
+        hist[start:end] = np.bincount((block + offsets).ravel(), minlength=rows * 256).reshape(rows, 256)
+
+    # # The last chunk may be short
+    if full_chunks < len(hist):
+        hist[full_chunks] = np.bincount(buf[full_chunks * chunksize :], minlength=256)
+
+
+# # Calculate the shannon entropy (base 256, so 0 to 1) of each chunk from its byte counts
+def chunk_entropy(hist, use_numba=False):
+
+    if use_numba:
+        shannon_samples = np.empty(len(hist), dtype=np.float64)
+        _load_kernel().chunk_entropy(hist, shannon_samples)
+        return shannon_samples
+
+    p = hist / hist.sum(axis=1, keepdims=True)
+    # # log(1) == 0, so bytes that don't occur add nothing
+    return -(p * np.log(np.where(hist > 0, p, 1))).sum(axis=1) / np.log(256)
+
+
+# # The numba kernels are only imported when asked for, numba is optional
+def _load_kernel():
+    try:
+        from . import _kernel
+    except ImportError:
+        import _kernel
+
+    return _kernel
 
 
 if __name__ == "__main__":
@@ -563,4 +595,4 @@ if __name__ == "__main__":
         plt.show()
     else:
         plt.savefig(args_dict["abs_save_fpath"], format=args.format, dpi=args.dpi, **save_kwargs)
-        log.info('Graph saved to: "{}"'.format(args_dict["abs_save_fpath"]))
+        log.info('Graph saved to: "%s"', args_dict["abs_save_fpath"])
@@ -24,7 +24,6 @@ matplotlib.use("Agg")
 import matplotlib.ticker as ticker
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MaxNLocator
-from collections import Counter
 
 import logging
 
@@ -76,9 +75,7 @@ def args_validation(args):
     # # Test to see what matplotlib backend is setup
     backend = matplotlib.get_backend()
     if not backend == "TkAgg":
-        log.warning(
-            '{} matplotlib backend in use. This graph generation was tested with "TkAgg", bugs may lie ahead...'.format(backend)
-        )
+        log.warning('%s matplotlib backend in use. This graph generation was tested with "TkAgg", bugs may lie ahead...', backend)
 
     # # Test to see if we should use defaults
     if args.graphtype == "all":
@@ -96,30 +93,44 @@ def args_validation(args):
 
 
 def generate(
-    abs_fpath, fname, no_zero=__no_zero__, width=__width__, g_log=__g_log__, no_order=__no_order__, colours=__colours__, **kwargs
+    abs_fpath,
+    fname,
+    no_zero=__no_zero__,
+    width=__width__,
+    g_log=__g_log__,
+    no_order=__no_order__,
+    colours=__colours__,
+    fig=None,
+    _mmap=None,
+    **kwargs
 ):
 
-    file_array = []
-    with open(abs_fpath, "rb") as fh:
-        for x in bytearray(fh.read()):
-            file_array.append(x)
+    # # Use the file mapping shared by all graphs if given
+    if _mmap is not None:
+        file_array = np.frombuffer(_mmap, dtype=np.uint8)
+    else:
+        file_array = np.fromfile(abs_fpath, dtype=np.uint8)
 
-    log.debug('Read: "{}", length: {}'.format(fname, len(file_array)))
+    log.debug('Read: "%s", length: %s', fname, len(file_array))
+    counts = np.bincount(file_array, minlength=256)
+    del file_array
 
-    log.debug("Ignore 0's: {}".format(no_zero))
+    log.debug("Ignore 0's: %s", no_zero)
     no_zero = -int(no_zero)
 
-    fig, ax = plt.subplots()
+    # # Create the figure, or draw on the one given
+    if fig is None:
+        fig, ax = plt.subplots()
+    else:
+        ax = fig.add_subplot()
 
-    # # Add a byte hist ordered 1 > 255
-    ordered_row = []
-    c = Counter(file_array)
-    for x in range(no_zero, 256):
-        ordered_row.append(c[x])
+    # # Add a byte hist ordered 1 > 255. Ignoring 0's starts the range at -1, which never occurs
+    ordered_row = np.concatenate((np.zeros(-no_zero, dtype=counts.dtype), counts))
 
+    # # Bars are clipped to the axes, so can't change the layout - leaving them out saves checking each one
     ax.bar(
         np.array(list(range(no_zero, 256))),
-        np.array(ordered_row),
+        ordered_row,
         align="edge",
         width=width,
         label="Bytes",
@@ -127,22 +138,17 @@ def generate(
         log=g_log,
         zorder=0,
         linewidth=0,
+        in_layout=False,
     )
     log.debug("Graphed binary array")
 
     # # Add a byte hist ordered by occurrence - shows general distribution
     if not no_order:
-        sorted_row = []
-        c = Counter(file_array)
-        for x in range(no_zero, 256):
-            sorted_row.append(c[x])
-
-        sorted_row.sort()
-        sorted_row.reverse()
+        sorted_row = np.sort(ordered_row)[::-1]
 
         ax.bar(
             np.array(list(range(no_zero, 256))),
-            np.array(sorted_row),
+            sorted_row,
             width=width,
             label="Ordered",
             color=colours[1],
@@ -150,6 +156,7 @@ def generate(
             zorder=1,
             alpha=0.5,
             linewidth=0,
+            in_layout=False,
         )
         log.debug("Graphed ordered binary array")
 
@@ -173,9 +180,9 @@ def generate(
         ax.set_xbound(lower=0, upper=255)
         log.debug("Setting xlim/xbounds to (0,255)")
 
-    plt.legend(loc="upper center", ncol=3, bbox_to_anchor=(0.5, 1.07), framealpha=1)
+    ax.legend(loc="upper center", ncol=3, bbox_to_anchor=(0.5, 1.07), framealpha=1)
 
-    plt.title("Byte histogram: {}\n".format(fname))
+    ax.set_title("Byte histogram: {}\n".format(fname))
 
     return plt, {}, {}
 
@@ -250,4 +257,4 @@ if __name__ == "__main__":
         plt.show()
     else:
         plt.savefig(args_dict["abs_save_fpath"], format=args.format, dpi=args.dpi, **save_kwargs)
-        log.info('Graph saved to: "{}"'.format(args_dict["abs_save_fpath"]))
+        log.info('Graph saved to: "%s"', args_dict["abs_save_fpath"])
@@ -32,4 +32,7 @@ setup(
         "numpy>=1.19.1", # 1.21.0
         "pefile>=2021.9.3",
     ],
+    extras_require={
+        "numba": ["numba"],  # Compiled entropy kernels for the ent graph
+    },
 )